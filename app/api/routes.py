@@ -96,25 +96,8 @@ def toggle_vote():
         if not song:
             return jsonify({'error': 'Song not found or not in wishlist'}), 404
         
-        # Check if user already voted
-        existing_vote = Vote.query.filter_by(
-            user_id=current_user.id,
-            song_id=song_id
-        ).first()
-        
-        if existing_vote:
-            # Remove vote
-            db.session.delete(existing_vote)
-            action = 'removed'
-        else:
-            # Add vote
-            vote = Vote(
-                user_id=current_user.id,
-                song_id=song_id
-            )
-            db.session.add(vote)
-            action = 'added'
-        
+        # Add the vote, or remove it if the user already voted
+        action = 'added' if song.toggle_vote(current_user.id) else 'removed'
         db.session.commit()
         
         # Get updated vote count
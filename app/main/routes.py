@@ -5,8 +5,10 @@ from app.main import main
 from app.auth import login_required, band_leader_required, handle_google_login, logout
 from app.models import User, Band, Song, SongProgress, Vote, SongStatus, ProgressStatus, Invitation, InvitationStatus, SetlistConfig, UserRole, band_membership
 from app import db
+from sqlalchemy.orm import selectinload
 from app.spotify import spotify_api
 from datetime import datetime, date, timedelta
+from itertools import accumulate
 import json
 import uuid
 
@@ -476,16 +478,9 @@ def generate_setlist():
         time_learning = round(clustered_duration * learning_ratio)
         time_maintenance = clustered_duration - time_learning
         
-        # Get songs for the current band
-        current_band_id = session.get('current_band_id')
-        if not current_band_id:
-            return jsonify({'error': 'No band selected'}), 400
-        
-        current_band = db.session.get(Band, current_band_id)
-        if not current_band:
-            return jsonify({'error': 'Band not found'}), 400
-        
-        active_songs = Song.query.filter_by(
+        # Get songs for the current band, with the progress rows their
+        # readiness scores are computed from
+        active_songs = Song.query.options(selectinload(Song.progress)).filter_by(
             band_id=current_band_id,
             status=SongStatus.ACTIVE
         ).all()
@@ -498,19 +493,23 @@ def generate_setlist():
         learning_pool = []
         maintenance_pool = []
         
+        # Load which members are ready on each song in a single query
+        # instead of one query per song and member
+        member_ids = {member.id for member in current_band.members}
+        ready_members = {}
+        ready_progress = SongProgress.query.with_entities(
+            SongProgress.song_id, SongProgress.user_id
+        ).filter(
+            SongProgress.song_id.in_([song.id for song in active_songs]),
+            SongProgress.user_id.in_(list(member_ids)),
+            SongProgress.status.in_([ProgressStatus.READY_FOR_REHEARSAL, ProgressStatus.MASTERED])
+        )
+        for song_id, user_id in ready_progress:
+            ready_members.setdefault(song_id, set()).add(user_id)
+        
         for song in active_songs:
             # Check if all members have mastered the song or are ready for rehearsal
-            all_ready_or_mastered = True
-            for member in current_band.members:
-                progress = SongProgress.query.filter_by(
-                    user_id=member.id,
-                    song_id=song.id
-                ).first()
-                if not progress or progress.status not in [ProgressStatus.READY_FOR_REHEARSAL, ProgressStatus.MASTERED]:
-                    all_ready_or_mastered = False
-                    break
-            
-            if all_ready_or_mastered:
+            if ready_members.get(song.id, set()) >= member_ids:
                 maintenance_pool.append(song)
             else:
                 learning_pool.append(song)
@@ -586,9 +585,8 @@ def generate_setlist():
             }
         
         # Calculate cumulative times with buffer durations
-        cumulative_time = 0
-        for item in full_setlist:
-            cumulative_time += item['duration_with_buffer']
+        running_totals = accumulate(item['duration_with_buffer'] for item in full_setlist)
+        for item, cumulative_time in zip(full_setlist, running_totals):
             item['cumulative_time'] = round(cumulative_time, 1)
         
         result = {
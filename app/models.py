@@ -18,6 +18,15 @@ class ProgressStatus(Enum):
     MASTERED = 'Mastered'
 
 
+# Points each progress status contributes to a song's readiness score
+READINESS_POINTS = {
+    ProgressStatus.TO_LISTEN: 1,
+    ProgressStatus.IN_PRACTICE: 2,
+    ProgressStatus.READY_FOR_REHEARSAL: 3,
+    ProgressStatus.MASTERED: 4,
+}
+
+
 class InvitationStatus(Enum):
     PENDING = 'pending'
     ACCEPTED = 'accepted'
@@ -331,18 +340,27 @@ class Song(db.Model):
         if not self.progress:
             return 0
 
-        total_progress = 0
-        for prog in self.progress:
-            if prog.status == ProgressStatus.MASTERED:
-                total_progress += 4
-            elif prog.status == ProgressStatus.READY_FOR_REHEARSAL:
-                total_progress += 3
-            elif prog.status == ProgressStatus.IN_PRACTICE:
-                total_progress += 2
-            elif prog.status == ProgressStatus.TO_LISTEN:
-                total_progress += 1
+        total_progress = sum(READINESS_POINTS.get(prog.status, 0)
+                             for prog in self.progress)
+        return total_progress / len(self.progress)
+
+    def toggle_vote(self, user_id):
+        """Add the user's vote, or remove it if they already voted.
+
+        Returns True if the user is now voting for the song. The caller is
+        responsible for committing the session.
+        """
+        existing_vote = Vote.query.filter_by(
+            user_id=user_id,
+            song_id=self.id
+        ).first()
 
-        return total_progress / len(self.progress) if self.progress else 0
+        if existing_vote:
+            db.session.delete(existing_vote)
+            return False
+
+        db.session.add(Vote(user_id=user_id, song_id=self.id))
+        return True
 
 
 class SongProgress(db.Model):
@@ -430,22 +448,18 @@ class SetlistConfig(db.Model):
 
     def get_clustered_duration(self, target_duration_minutes):
         """Cluster duration to nearest 30-minute interval within min/max bounds"""
+        # Bounds need not be multiples of the cluster, so out-of-range
+        # targets snap to the bound itself rather than being rounded
         if target_duration_minutes < self.min_session_minutes:
             return self.min_session_minutes
 
         if target_duration_minutes > self.max_session_minutes:
             return self.max_session_minutes
 
-        # Round to nearest 30-minute interval
-        rounded = round(target_duration_minutes / self.time_cluster_minutes) * self.time_cluster_minutes
-
-        # Ensure the rounded value is within bounds
-        if rounded < self.min_session_minutes:
-            rounded = self.min_session_minutes
-        elif rounded > self.max_session_minutes:
-            rounded = self.max_session_minutes
-
-        return rounded
+        rounded = (round(target_duration_minutes / self.time_cluster_minutes) *
+                   self.time_cluster_minutes)
+        return min(self.max_session_minutes,
+                   max(self.min_session_minutes, rounded))
 
     def calculate_song_duration_with_buffer(self, song_duration_seconds,
                                           is_learned):
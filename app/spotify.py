@@ -1,9 +1,20 @@
+import base64
 import requests
 import os
 import logging
+from time import monotonic, sleep
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+# (connect, read) timeouts in seconds for every Spotify request
+REQUEST_TIMEOUT = (3.05, 10)
+
+# Longest Retry-After, in seconds, worth waiting out inside a request;
+# anything longer fails fast instead of holding up the worker
+MAX_RETRY_AFTER = 2
+
 
 class SpotifyAPI:
     """Spotify API client for searching tracks and getting metadata"""
@@ -15,10 +26,37 @@ class SpotifyAPI:
         self.access_token = None
         self.token_expires_at = None
         self.last_error = None
-        self.is_configured = bool(self.client_id and self.client_secret)
+        self._basic_auth = None
+        self._basic_auth_credentials = None
+        self.session = self._create_session()
+
+    @staticmethod
+    def _create_session():
+        """Create an HTTP session that keeps connections to Spotify alive"""
+        session = requests.Session()
+        # Token requests are safe to repeat, so POST is retried as well
+        # Rate limits (429) are handled in _get so their wait can be capped
+        retries = Retry(total=3, backoff_factor=0.3,
+                        status_forcelist=[500, 502, 503, 504],
+                        allowed_methods=['GET', 'POST'],
+                        respect_retry_after_header=False)
+        session.mount('https://', HTTPAdapter(pool_connections=4,
+                                              pool_maxsize=10,
+                                              max_retries=retries))
+        return session
+
+    @property
+    def is_configured(self):
+        """Whether client credentials are available"""
+        return bool(self.client_id and self.client_secret)
+
+    def _get_access_token(self, now=None):
+        """Get a new access token using client credentials flow
 
-    def _get_access_token(self):
-        """Get a new access token using client credentials flow"""
+        Args:
+            now (float): monotonic() reading to base the expiry on,
+                taken when the method is called if not given
+        """
         if not self.is_configured:
             self.last_error = "Spotify credentials not configured"
             logger.error("Spotify credentials not configured")
@@ -33,14 +71,17 @@ class SpotifyAPI:
                 'Authorization': f'Basic {self._get_basic_auth_header()}'
             }
 
-            response = requests.post(auth_url, data=auth_data,
-                                    headers=auth_headers, timeout=10)
+            response = self.session.post(auth_url, data=auth_data,
+                                         headers=auth_headers,
+                                         timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
 
             token_data = response.json()
             self.access_token = token_data['access_token']
             # Token expires in 1 hour, set expiry 5 minutes earlier for safety
-            self.token_expires_at = token_data['expires_in'] - 300
+            if now is None:
+                now = monotonic()
+            self.token_expires_at = now + token_data['expires_in'] - 300
             self.last_error = None
 
             logger.info("Successfully obtained Spotify access token")
@@ -65,15 +106,69 @@ class SpotifyAPI:
 
     def _get_basic_auth_header(self):
         """Create basic auth header from client credentials"""
-        import base64
-        credentials = f"{self.client_id}:{self.client_secret}"
-        encoded = base64.b64encode(credentials.encode()).decode()
-        return encoded
-
-    def _is_token_valid(self):
+        # Encoded once per set of credentials, re-encoded if they change
+        credentials = (self.client_id, self.client_secret)
+        if credentials != self._basic_auth_credentials:
+            encoded = f"{self.client_id}:{self.client_secret}".encode()
+            self._basic_auth = base64.b64encode(encoded).decode()
+            self._basic_auth_credentials = credentials
+        return self._basic_auth
+
+    def _is_token_valid(self, now=None):
         """Check if current access token is still valid"""
-        return (self.access_token and self.token_expires_at and
-                 self.token_expires_at > 0)
+        if not (self.access_token and self.token_expires_at):
+            return False
+        if now is None:
+            now = monotonic()
+        return self.token_expires_at > now
+
+    def _get(self, url, **kwargs):
+        """
+        GET an API url with the current token, retrying a rate limited
+        request once if Spotify asks to wait at most MAX_RETRY_AFTER
+
+        Returns:
+            requests.Response: The response
+        """
+        response = self.session.get(
+            url,
+            headers={'Authorization': f'Bearer {self.access_token}'},
+            timeout=REQUEST_TIMEOUT,
+            **kwargs
+        )
+        if response.status_code != 429:
+            return response
+
+        retry_after = response.headers.get('Retry-After', '')
+        if not retry_after.isdigit() or int(retry_after) > MAX_RETRY_AFTER:
+            logger.warning(f"Spotify rate limit, Retry-After: {retry_after!r}")
+            return response
+
+        sleep(int(retry_after))
+        return self.session.get(
+            url,
+            headers={'Authorization': f'Bearer {self.access_token}'},
+            timeout=REQUEST_TIMEOUT,
+            **kwargs
+        )
+
+    def _api_get(self, url, now, **kwargs):
+        """
+        GET an API url, renewing the access token once if it is rejected
+
+        Returns:
+            requests.Response: The response, or None if the token could
+            not be renewed
+        """
+        response = self._get(url, **kwargs)
+        if response.status_code != 401:
+            return response
+
+        logger.info("Spotify rejected the access token, requesting a new one")
+        if not self._get_access_token(now):
+            return None
+
+        return self._get(url, **kwargs)
 
     def search_tracks(self, query, limit=10):
         """
@@ -89,17 +184,14 @@ class SpotifyAPI:
         if not self.is_configured:
             return {'tracks': [], 'error': 'Spotify API not configured'}
 
-        if not self._is_token_valid():
-            if not self._get_access_token():
+        now = monotonic()
+        if not self._is_token_valid(now):
+            if not self._get_access_token(now):
                 return {'tracks': [],
                         'error': (self.last_error or
                                   'Failed to authenticate with Spotify')}
 
         try:
-            headers = {
-                'Authorization': f'Bearer {self.access_token}'
-            }
-
             params = {
                 'q': query,
                 'type': 'track',
@@ -107,12 +199,12 @@ class SpotifyAPI:
                 'market': 'US'  # You can make this configurable
             }
 
-            response = requests.get(
-                f"{self.base_url}/search",
-                headers=headers,
-                params=params,
-                timeout=10
-            )
+            response = self._api_get(f"{self.base_url}/search", now,
+                                     params=params)
+            if response is None:
+                return {'tracks': [],
+                        'error': (self.last_error or
+                                  'Failed to authenticate with Spotify')}
             response.raise_for_status()
 
             data = response.json()
@@ -175,19 +267,15 @@ class SpotifyAPI:
         Returns:
             dict: Track information or None if not found
         """
-        if not self._is_token_valid():
-            if not self._get_access_token():
+        now = monotonic()
+        if not self._is_token_valid(now):
+            if not self._get_access_token(now):
                 return None
 
         try:
-            headers = {
-                'Authorization': f'Bearer {self.access_token}'
-            }
-
-            response = requests.get(
-                f"{self.base_url}/tracks/{track_id}",
-                headers=headers
-            )
+            response = self._api_get(f"{self.base_url}/tracks/{track_id}", now)
+            if response is None:
+                return None
             response.raise_for_status()
 
             track = response.json()
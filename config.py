@@ -1,5 +1,6 @@
 import os
 from dotenv import load_dotenv
+from sqlalchemy.pool import StaticPool
 
 load_dotenv()
 
@@ -48,8 +49,12 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     
     # Test-specific settings
+    # One shared connection keeps the in-memory database alive for the whole
+    # app, whichever thread uses it
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'echo': False
+        'echo': False,
+        'poolclass': StaticPool,
+        'connect_args': {'check_same_thread': False}
     }
 
 # Configuration mapping
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Sharded Test Runner for BandMate
+Splits the Spotify API tests into shards and runs each shard as its own pytest process
+"""
+
+import os
+import sys
+import subprocess
+import time
+
+SPOTIFY_TEST_FILES = [
+    'tests/test_spotify_integration.py',
+    'tests/test_spotify_simple.py'
+]
+
+def default_shard_count():
+    """Number of shards to run, leaving two cores free for the OS and editor"""
+    return max((os.cpu_count() or 1) - 2, 1)
+
+def collect_node_ids(test_files):
+    """Collect the test node ids of the given files without running them"""
+    cmd = ['python', '-m', 'pytest', '--collect-only', '-q', '--no-cov', *test_files]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return [line for line in result.stdout.splitlines() if '::' in line]
+
+def run_parallel(node_ids, shards=None):
+    """Run test node ids split across concurrent pytest processes"""
+    shards = min(shards or default_shard_count(), len(node_ids))
+    if not shards:
+        print("❌ No tests to run")
+        return False
+
+    # Round-robin so every shard gets tests from each class
+    batches = [node_ids[i::shards] for i in range(shards)]
+
+    print(f"🚀 Running {len(node_ids)} tests in {shards} shards")
+    print("=" * 60)
+
+    start_time = time.time()
+
+    # Coverage is off in shards: concurrent runs would overwrite one data file
+    processes = [
+        subprocess.Popen(['python', '-m', 'pytest', '-q', '--no-cov', *batch])
+        for batch in batches
+    ]
+
+    try:
+        exit_codes = [process.wait() for process in processes]
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        print("\n⏹️  Tests interrupted by user")
+        return False
+
+    end_time = time.time()
+    print("=" * 60)
+
+    failed = [i for i, code in enumerate(exit_codes) if code != 0]
+    if failed:
+        print(f"❌ Shards {failed} failed! (took {end_time - start_time:.2f} seconds)")
+        return False
+
+    print(f"✅ All shards passed! (took {end_time - start_time:.2f} seconds)")
+    return True
+
+def main():
+    """Main test runner"""
+    print("🧪 BandMate Sharded Spotify Test Runner")
+    print("=" * 60)
+
+    shards = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    success = run_parallel(collect_node_ids(SPOTIFY_TEST_FILES), shards)
+
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
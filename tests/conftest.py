@@ -1,49 +1,113 @@
+import copy
+import importlib
 import pytest
-import tempfile
 import os
-from app import create_app, db
-from app.models import User, Band, Song, SongProgress, Vote, SongStatus, ProgressStatus
+import json
+import logging
+from flask import template_rendered
+from app import create_app, db, login_manager
+from app.models import User, Band, Song, SongProgress, Vote, SongStatus, ProgressStatus, UserRole
+import app.spotify as spotify
+from app.spotify import SpotifyAPI
 from datetime import datetime, date, timedelta
+from sqlalchemy import insert, select
 
-@pytest.fixture
-def app():
-    """Create and configure a new app instance for each test."""
-    # Create a temporary file to isolate the database for each test
-    db_fd, db_path = tempfile.mkstemp()
-    
+@pytest.fixture(scope='session')
+def base_app():
+    """Create and configure the app instance once for the whole test session."""
     # Set test environment variables before creating app
     os.environ['FLASK_ENV'] = 'testing'
     os.environ['FLASK_SECRET_KEY'] = 'test-secret-key'
-    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
     os.environ['GOOGLE_CLIENT_ID'] = 'test-client-id'
     os.environ['GOOGLE_CLIENT_SECRET'] = 'test-client-secret'
     
-    app = create_app()
+    # TestingConfig provides the in-memory SQLite engine
+    app = create_app('testing')
     app.config.update({
         'TESTING': True,
-        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
         'WTF_CSRF_ENABLED': False,
         'FLASK_SECRET_KEY': 'test-secret-key',
         'GOOGLE_OAUTH_CLIENT_ID': 'test-client-id',
-        'GOOGLE_OAUTH_CLIENT_SECRET': 'test-client-secret'
+        'GOOGLE_OAUTH_CLIENT_SECRET': 'test-client-secret',
+        'TEMPLATES_AUTO_RELOAD': False
     })
     
-    # Create the database and load test data
+    # Keep log handlers off the request path
+    app.logger.disabled = True
+    logging.getLogger('werkzeug').disabled = True
+    
+    # Compile every template up front so the first request rendering one
+    # doesn't pay for it
+    app.jinja_env.auto_reload = False
+    for template_name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template_name)
+    
+    # The schema is created once; each test only loads and clears data
     with app.app_context():
         db.create_all()
-        create_test_data()
-        yield app
-        db.session.remove()
+    
+    yield app
+    
+    with app.app_context():
         db.drop_all()
+
+# Users resolved by Flask-Login during the current test, keyed by id
+_loaded_users = {}
+
+def load_cached_user(user_id):
+    """User loader that resolves each user once per test."""
+    user = _loaded_users.get(user_id)
+    if user is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            _loaded_users[user_id] = user
+    return user
+
+@pytest.fixture
+def app(base_app):
+    """Provide the shared app with freshly seeded tables for each test."""
+    # Other test modules build their own apps and re-register the default
+    # loader on the shared login manager, so install ours for every test
+    login_manager.user_loader(load_cached_user)
     
-    os.close(db_fd)
-    os.unlink(db_path)
+    # Load test data into the session-wide schema
+    with base_app.app_context():
+        create_test_data()
+        yield base_app
+        _loaded_users.clear()
+        db.session.remove()
+        
+        # Empty the tables instead of dropping and recreating the schema
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
 
 @pytest.fixture
 def client(app):
     """A test client for the app."""
     return app.test_client()
 
+@pytest.fixture
+def post_json(client):
+    """POST a JSON payload through the test client."""
+    def post(url, payload):
+        return client.open(url, method='POST',
+                           data=json.dumps(payload, separators=(',', ':')),
+                           content_type='application/json', buffered=True)
+    return post
+
+@pytest.fixture
+def captured_templates(app):
+    """Record the (template, context) pairs rendered during a test."""
+    recorded = []
+
+    def record(sender, template, context, **extra):
+        recorded.append((template, context))
+
+    template_rendered.connect(record, app)
+    yield recorded
+    template_rendered.disconnect(record, app)
+
 @pytest.fixture
 def runner(app):
     """A test runner for the app's Click commands."""
@@ -85,6 +149,87 @@ def test_song(test_band):
     db.session.commit()
     return song
 
+@pytest.fixture
+def standard_corpus(test_band, test_user):
+    """Create ten active songs with progress for the test user."""
+    db.session.execute(insert(Song), [
+        {
+            'title': f"Corpus Song {i}",
+            'artist': "Corpus Artist",
+            'status': SongStatus.ACTIVE,
+            'duration_seconds': 180,
+            'band_id': test_band.id
+        }
+        for i in range(10)
+    ])
+    song_ids = db.session.scalars(
+        select(Song.id).filter_by(band_id=test_band.id)
+    ).all()
+    db.session.execute(insert(SongProgress), [
+        {
+            'user_id': test_user.id,
+            'song_id': song_id,
+            'status': ProgressStatus.READY_FOR_REHEARSAL
+        }
+        for song_id in song_ids
+    ])
+    db.session.commit()
+    return song_ids
+
+@pytest.fixture
+def band_members(test_band, test_user):
+    """Make the test user and a second user members of the test band."""
+    other_user = User(
+        id="test_user_456",
+        name="Other Member",
+        email="other@example.com",
+        band_id=test_band.id
+    )
+    db.session.add(other_user)
+    db.session.commit()
+    test_band.add_member(test_user, UserRole.LEADER)
+    test_band.add_member(other_user)
+    return [test_user, other_user]
+
+@pytest.fixture
+def member_corpus(test_band, band_members):
+    """Create ten learning and ten maintenance songs for a two-member band.
+
+    Learning songs are ready for the test user only; maintenance songs are
+    ready for both members. Every song lasts three minutes.
+    """
+    leader, other_user = band_members
+    db.session.execute(insert(Song), [
+        {
+            'title': f"{block} Song {i}",
+            'artist': "Corpus Artist",
+            'status': SongStatus.ACTIVE,
+            'duration_seconds': 180,
+            'band_id': test_band.id
+        }
+        for block in ("Learning", "Maintenance")
+        for i in range(10)
+    ])
+    songs = db.session.execute(
+        select(Song.id, Song.title).filter_by(band_id=test_band.id)
+    ).all()
+    other_status = {
+        "Learning": ProgressStatus.IN_PRACTICE,
+        "Maintenance": ProgressStatus.READY_FOR_REHEARSAL,
+    }
+    db.session.execute(insert(SongProgress), [
+        progress
+        for song_id, title in songs
+        for progress in (
+            {'user_id': leader.id, 'song_id': song_id,
+             'status': ProgressStatus.MASTERED},
+            {'user_id': other_user.id, 'song_id': song_id,
+             'status': other_status[title.split()[0]]},
+        )
+    ])
+    db.session.commit()
+    return songs
+
 @pytest.fixture
 def test_progress(test_user, test_song):
     """Create test progress record."""
@@ -97,60 +242,102 @@ def test_progress(test_user, test_song):
     db.session.commit()
     return progress
 
+spotify_prototype_key = pytest.StashKey[SpotifyAPI]()
+
+def pytest_configure(config):
+    """Build one configured SpotifyAPI per test process (and xdist worker)."""
+    prototype = SpotifyAPI()
+    prototype.client_id = "test_client_id"
+    prototype.client_secret = "test_client_secret"
+    config.stash[spotify_prototype_key] = prototype
+
+@pytest.fixture
+def configured_api(request):
+    """A SpotifyAPI client with test credentials and no cached token."""
+    # Shallow copy: every test shares the prototype's pooled HTTP session
+    api = copy.copy(request.config.stash[spotify_prototype_key])
+    api.access_token = None
+    api.token_expires_at = None
+    api.last_error = None
+    return api
+
+@pytest.fixture
+def spotify_clock(monkeypatch):
+    """Freeze the monotonic clock SpotifyAPI uses for token expiry."""
+    now = 500.0
+    monkeypatch.setattr('app.spotify.monotonic', lambda: now)
+    return now
+
+SPOTIFY_ENVIRONMENTS = {
+    'configured': {'SPOTIFY_CLIENT_ID': 'test_id',
+                   'SPOTIFY_CLIENT_SECRET': 'test_secret'},
+    'unconfigured': {},
+}
+
+@pytest.fixture(params=sorted(SPOTIFY_ENVIRONMENTS))
+def spotify_module(request, monkeypatch):
+    """Reload app.spotify so its global client reads the patched environment."""
+    monkeypatch.delenv('SPOTIFY_CLIENT_ID', raising=False)
+    monkeypatch.delenv('SPOTIFY_CLIENT_SECRET', raising=False)
+    for name, value in SPOTIFY_ENVIRONMENTS[request.param].items():
+        monkeypatch.setenv(name, value)
+    yield importlib.reload(spotify)
+    # Rebuild the global client from the real environment again
+    monkeypatch.undo()
+    importlib.reload(spotify)
+
 def create_test_data():
     """Create test data for all tests."""
+    # The tables are empty, so ids can be assigned up front and every table
+    # written with a single insert, without flushing in between
+    band_id = 1
+    user_ids = [f"test_user_{i}" for i in range(3)]
+    song_ids = [1, 2, 3, 4, 5]
+    
     # Create test band
-    band = Band(name="Test Band")
-    db.session.add(band)
-    db.session.flush()
+    db.session.execute(insert(Band), [{'id': band_id, 'name': "Test Band"}])
     
     # Create test users
-    users = []
-    for i in range(3):
-        user = User(
-            id=f"test_user_{i}",
-            name=f"Test User {i}",
-            email=f"user{i}@test.com",
-            band_id=band.id,
-            is_band_leader=(i == 0)
-        )
-        users.append(user)
-        db.session.add(user)
-    
-    db.session.flush()
+    db.session.execute(insert(User), [
+        {
+            'id': user_id,
+            'name': f"Test User {i}",
+            'email': f"user{i}@test.com",
+            'band_id': band_id,
+            'is_band_leader': (i == 0)
+        }
+        for i, user_id in enumerate(user_ids)
+    ])
     
     # Create test songs
-    songs = []
-    for i in range(5):
-        song = Song(
-            title=f"Test Song {i}",
-            artist=f"Test Artist {i}",
-            status=SongStatus.ACTIVE if i < 3 else SongStatus.WISHLIST,
-            duration_seconds=(3 + i) * 60,  # Convert minutes to seconds
-            band_id=band.id
-        )
-        songs.append(song)
-        db.session.add(song)
-    
-    db.session.flush()
+    db.session.execute(insert(Song), [
+        {
+            'id': song_id,
+            'title': f"Test Song {i}",
+            'artist': f"Test Artist {i}",
+            'status': SongStatus.ACTIVE if i < 3 else SongStatus.WISHLIST,
+            'duration_seconds': (3 + i) * 60,  # Convert minutes to seconds
+            'band_id': band_id
+        }
+        for i, song_id in enumerate(song_ids)
+    ])
     
     # Create progress records for active songs
-    for song in songs[:3]:  # Only active songs
-        for user in users:
-            progress = SongProgress(
-                user_id=user.id,
-                song_id=song.id,
-                status=ProgressStatus.TO_LISTEN
-            )
-            db.session.add(progress)
+    db.session.execute(insert(SongProgress), [
+        {
+            'user_id': user_id,
+            'song_id': song_id,
+            'status': ProgressStatus.TO_LISTEN
+        }
+        for song_id in song_ids[:3]  # Only active songs
+        for user_id in user_ids
+    ])
     
     # Create some votes
-    for song in songs[3:]:  # Only wishlist songs
-        for user in users[:2]:  # Only first two users vote
-            vote = Vote(
-                user_id=user.id,
-                song_id=song.id
-            )
-            db.session.add(vote)
+    db.session.execute(insert(Vote), [
+        {'user_id': user_id, 'song_id': song_id}
+        for song_id in song_ids[3:]  # Only wishlist songs
+        for user_id in user_ids[:2]  # Only first two users vote
+    ])
     
     db.session.commit()
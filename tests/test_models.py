@@ -263,6 +263,26 @@ class TestVote:
             with pytest.raises(Exception):
                 db.session.commit()
 
+    def test_toggle_vote(self, app, test_user, test_song):
+        """Test toggling a vote adds it and then removes it."""
+        with app.app_context():
+            # First toggle adds the vote
+            assert test_song.toggle_vote(test_user.id) is True
+            db.session.commit()
+
+            vote = Vote.query.filter_by(user_id=test_user.id,
+                                        song_id=test_song.id).first()
+            assert vote is not None
+            assert Vote.query.filter_by(song_id=test_song.id).count() == 1
+
+            # Second toggle removes it again
+            assert test_song.toggle_vote(test_user.id) is False
+            db.session.commit()
+
+            assert Vote.query.filter_by(user_id=test_user.id,
+                                        song_id=test_song.id).first() is None
+            assert Vote.query.filter_by(song_id=test_song.id).count() == 0
+
 class TestModelRelationships:
     """Test complex model relationships and cascading."""
     
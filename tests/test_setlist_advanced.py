@@ -3,6 +3,9 @@ import pytest
 from app import db
 from app.models import SongProgress, ProgressStatus, SetlistConfig
 
+# Statuses used throughout the suite
+IN_PRACTICE = ProgressStatus.IN_PRACTICE
+
 
 class TestAdvancedSetlistFeatures:
     """Test advanced setlist features including buffer percentages and time
@@ -10,109 +13,103 @@ class TestAdvancedSetlistFeatures:
 
     def test_setlist_config_creation(self, app, test_band):
         """Test that SetlistConfig is automatically created for bands."""
-        with app.app_context():
-            # Get the band's config
-            config = test_band.get_setlist_config()
-
-            assert config is not None
-            assert config.band_id == test_band.id
-            assert config.new_songs_buffer_percent == 20.0
-            assert config.learned_songs_buffer_percent == 10.0
-            assert config.break_time_minutes == 10
-            assert config.break_threshold_minutes == 90
-            assert config.min_session_minutes == 30
-            assert config.max_session_minutes == 240
-            assert config.time_cluster_minutes == 30
-
-    def test_time_clustering(self, app, test_band):
-        """Test time clustering to nearest 30-minute interval."""
-        with app.app_context():
-            config = test_band.get_setlist_config()
-
-            # Test clustering
-            # Rounds to nearest 30-min interval
-            assert config.get_clustered_duration(45) == 60
-            assert config.get_clustered_duration(60) == 60  # Exact interval
-            assert config.get_clustered_duration(75) == 60  # Rounds down
-            assert config.get_clustered_duration(90) == 90  # Exact interval
-            assert config.get_clustered_duration(105) == 120  # Rounds up
-            assert config.get_clustered_duration(300) == 240  # Above maximum
-
-    def test_buffer_calculation(self, app, test_band):
-        """Test buffer percentage calculations for songs."""
-        with app.app_context():
-            config = test_band.get_setlist_config()
-
-            # Test new songs buffer (20%)
-            # 3 minutes
-            new_song_duration = config.calculate_song_duration_with_buffer(
-                180, is_learned=False)
-            assert abs(new_song_duration - 3.6) < 0.001  # 3 * 1.2 = 3.6
-
-            # Test learned songs buffer (10%)
-            # 3 minutes
-            learned_song_duration = config.calculate_song_duration_with_buffer(
-                180, is_learned=True)
-            assert abs(learned_song_duration - 3.3) < 0.001  # 3 * 1.1 = 3.3
-
-    def test_break_configuration(self, app, test_band):
-        """Test break threshold logic."""
-        with app.app_context():
-            config = test_band.get_setlist_config()
-
-            # Test break needed
-            assert config.is_break_needed(90) is True
-            assert config.is_break_needed(120) is True
-
-            # Test break not needed
-            assert config.is_break_needed(60) is False
-            assert config.is_break_needed(45) is False
+        # Get the band's config
+        config = test_band.get_setlist_config()
+
+        assert config is not None
+        assert config.band_id == test_band.id
+        assert config.new_songs_buffer_percent == 20.0
+        assert config.learned_songs_buffer_percent == 10.0
+        assert config.break_time_minutes == 10
+        assert config.break_threshold_minutes == 90
+        assert config.min_session_minutes == 30
+        assert config.max_session_minutes == 240
+        assert config.time_cluster_minutes == 30
+
+    @pytest.fixture
+    def config(self, app, test_band):
+        """The band's default setlist configuration."""
+        return test_band.get_setlist_config()
+
+    @pytest.mark.parametrize('method, args, expected', [
+        # Time clustering to the nearest 30-min interval within bounds
+        ('get_clustered_duration', (45,), 60),
+        ('get_clustered_duration', (60,), 60),  # Exact interval
+        ('get_clustered_duration', (75,), 60),  # Rounds down
+        ('get_clustered_duration', (90,), 90),  # Exact interval
+        ('get_clustered_duration', (105,), 120),  # Rounds up
+        ('get_clustered_duration', (300,), 240),  # Above maximum
+        # Buffer percentages on a 3-minute song
+        ('calculate_song_duration_with_buffer', (180, False),
+         pytest.approx(3.6)),  # 3 * 1.2, new songs buffer (20%)
+        ('calculate_song_duration_with_buffer', (180, True),
+         pytest.approx(3.3)),  # 3 * 1.1, learned songs buffer (10%)
+        # Break threshold
+        ('is_break_needed', (90,), True),
+        ('is_break_needed', (120,), True),
+        ('is_break_needed', (60,), False),
+        ('is_break_needed', (45,), False),
+    ])
+    def test_config_calculations(self, config, method, args, expected):
+        """Test clustering, buffer and break calculations on the config."""
+        assert getattr(config, method)(*args) == expected
+
+    @pytest.mark.parametrize('target, expected', [
+        (35, 40),    # Below minimum snaps to the minimum, not the cluster
+        (260, 250),  # Above maximum snaps to the maximum, not the cluster
+        (41, 60),    # In range, rounds up to the nearest cluster
+        (100, 120),  # In range, rounds up to the nearest cluster
+        (245, 240),  # In range, rounds down to the nearest cluster
+    ])
+    def test_clustered_duration_uneven_bounds(self, target, expected):
+        """Test clustering when the bounds are not multiples of the cluster."""
+        config = SetlistConfig(min_session_minutes=40, max_session_minutes=250,
+                               time_cluster_minutes=60)
+        assert config.get_clustered_duration(target) == expected
 
     def test_setlist_config_update(self, app, test_band):
         """Test updating setlist configuration."""
-        with app.app_context():
-            # Create config first
-            config = test_band.get_setlist_config()
-            assert config is not None
-
-            # Update configuration
-            config.new_songs_buffer_percent = 25.0
-            config.learned_songs_buffer_percent = 15.0
-            config.break_time_minutes = 15
-            config.break_threshold_minutes = 120
-
-            db.session.commit()
-
-            # Verify changes
-            updated_config = SetlistConfig.query.filter_by(
-                band_id=test_band.id).first()
-            assert updated_config.new_songs_buffer_percent == 25.0
-            assert updated_config.learned_songs_buffer_percent == 15.0
-            assert updated_config.break_time_minutes == 15
-            assert updated_config.break_threshold_minutes == 120
+        # Create config first
+        config = test_band.get_setlist_config()
+        assert config is not None
+
+        # Update configuration
+        config.new_songs_buffer_percent = 25.0
+        config.learned_songs_buffer_percent = 15.0
+        config.break_time_minutes = 15
+        config.break_threshold_minutes = 120
+
+        db.session.commit()
+
+        # Verify changes
+        updated_config = SetlistConfig.query.filter_by(
+            band_id=test_band.id).first()
+        assert updated_config.new_songs_buffer_percent == 25.0
+        assert updated_config.learned_songs_buffer_percent == 15.0
+        assert updated_config.break_time_minutes == 15
+        assert updated_config.break_threshold_minutes == 120
 
     def test_buffer_in_setlist_generation(self, app, test_band, test_user, test_song):
         """Test that buffer percentages are applied during setlist generation."""
-        with app.app_context():
-            # Create progress record for the song
-            progress = SongProgress(
-                user_id=test_user.id,
-                song_id=test_song.id,
-                status=ProgressStatus.IN_PRACTICE  # This makes it a learning song
-            )
-            db.session.add(progress)
-            db.session.commit()
-
-            # Get the band's config
-            config = test_band.get_setlist_config()
-
-            # Calculate duration with buffer
-            original_duration = test_song.duration_seconds / 60  # in minutes
-            buffered_duration = config.calculate_song_duration_with_buffer(
-                test_song.duration_seconds, is_learned=False
-            )
-
-            # Verify buffer is applied
-            assert buffered_duration > original_duration
-            assert (buffered_duration ==
-                   original_duration * (1 + config.new_songs_buffer_percent / 100))
+        # Create progress record for the song
+        progress = SongProgress(
+            user_id=test_user.id,
+            song_id=test_song.id,
+            status=IN_PRACTICE  # This makes it a learning song
+        )
+        db.session.add(progress)
+        db.session.commit()
+
+        # Get the band's config
+        config = test_band.get_setlist_config()
+
+        # Calculate duration with buffer
+        original_duration = test_song.duration_seconds / 60  # in minutes
+        buffered_duration = config.calculate_song_duration_with_buffer(
+            test_song.duration_seconds, is_learned=False
+        )
+
+        # Verify buffer is applied
+        assert buffered_duration > original_duration
+        assert (buffered_duration ==
+               original_duration * (1 + config.new_songs_buffer_percent / 100))
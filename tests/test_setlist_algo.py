@@ -1,8 +1,29 @@
 import pytest
 from datetime import datetime, date, timedelta
+from flask import current_app, session
+from flask_login import login_user
 
 from app import db
-from app.models import Song, SongProgress, Vote, SongStatus, ProgressStatus
+from app.main.routes import generate_setlist
+from app.models import User, Song, SongProgress, Vote, SongStatus, ProgressStatus
+
+_TODAY = date.today()
+_WEEK_AGO = _TODAY - timedelta(days=7)
+
+# Progress statuses used by the pool tests
+TO_LISTEN = ProgressStatus.TO_LISTEN
+IN_PRACTICE = ProgressStatus.IN_PRACTICE
+READY_FOR_REHEARSAL = ProgressStatus.READY_FOR_REHEARSAL
+MASTERED = ProgressStatus.MASTERED
+
+
+def generate_setlist_logic(data, band, user):
+    """Run the generate_setlist view for a user and band, return its JSON."""
+    with current_app.test_request_context(method='POST', json=data):
+        login_user(user)
+        session['current_band_id'] = band.id
+        response = current_app.make_response(generate_setlist())
+    return response.get_json()
 
 
 class TestSetlistAlgorithm:
@@ -10,70 +31,158 @@ class TestSetlistAlgorithm:
 
     def test_basic_setlist_generation(self, app, test_band, test_user, test_song):
         """Test basic setlist generation with one song."""
-        with app.app_context():
-            # Create progress record
-            progress = SongProgress(
-                user_id=test_user.id,
-                song_id=test_song.id,
-                status=ProgressStatus.READY_FOR_REHEARSAL
-            )
-            db.session.add(progress)
-            db.session.commit()
-
-            # Test setlist generation via API
-            # This would need to be tested via the actual route
-
-            # For now, test the logic components
-            assert test_song.readiness_score > 0
-            assert test_song.status == SongStatus.ACTIVE
+        # Create progress record
+        progress = SongProgress(
+            user_id=test_user.id,
+            song_id=test_song.id,
+            status=ProgressStatus.READY_FOR_REHEARSAL
+        )
+        db.session.add(progress)
+        db.session.commit()
+
+        assert test_song.readiness_score > 0
+        assert test_song.status == SongStatus.ACTIVE
+
+        # Generate a setlist through the actual route
+        result = generate_setlist_logic(
+            {'duration_minutes_total': 60, 'learning_ratio': 0.5},
+            test_band, test_user)
+        assert result['summary']['total_duration'] == 60
+        assert [song['title'] for song in result['setlist']] == [test_song.title]
+
+    # Three-minute songs take 3.6 min with the 20% new songs buffer and
+    # 3.3 min with the 10% learned songs buffer; each pool holds ten songs
+    @pytest.mark.parametrize(
+        'duration, ratio, expected_total, learning_songs, maintenance_songs', [
+            (60, 0.5, 60, 8, 9),
+            (60, 1.0, 60, 10, 0),  # All learning
+            (60, 0.0, 60, 0, 10),  # All maintenance
+            (90, 0.3, 90, 7, 10),
+            (10, 0.5, 30, 4, 4),  # Below minimum
+            (300, 0.5, 240, 10, 10),  # Above maximum
+        ])
+    def test_setlist_generation_durations(self, app, test_band, test_user,
+                                          member_corpus, duration, ratio,
+                                          expected_total, learning_songs,
+                                          maintenance_songs):
+        """Test generated setlists fill each block's clustered time budget."""
+        result = generate_setlist_logic(
+            {'duration_minutes_total': duration, 'learning_ratio': ratio},
+            test_band, test_user)
+
+        blocks = [item['block'] for item in result['setlist']]
+        assert blocks == (['learning'] * learning_songs +
+                          ['maintenance'] * maintenance_songs)
+
+        summary = result['summary']
+        assert summary['total_duration'] == expected_total
+        assert summary['learning_time'] == pytest.approx(learning_songs * 3.6)
+        assert summary['maintenance_time'] == pytest.approx(
+            maintenance_songs * 3.3)
+
+    def test_setlist_pools_follow_member_readiness(self, app, test_band,
+                                                   test_user, band_members):
+        """Test songs are maintenance only when every member is ready."""
+        leader, other_user = band_members
+        outsider = User(id="outsider", name="Outsider",
+                        email="outsider@example.com")
+        db.session.add(outsider)
+
+        # Song title -> (leader, other member, non-member) progress
+        progress = {
+            "All Ready": (READY_FOR_REHEARSAL, READY_FOR_REHEARSAL, None),
+            "Mastered And Ready": (MASTERED, READY_FOR_REHEARSAL, None),
+            "Outsider Practicing": (MASTERED, MASTERED, IN_PRACTICE),
+            "Half Ready": (READY_FOR_REHEARSAL, IN_PRACTICE, None),
+            "Missing Progress": (MASTERED, None, None),
+            "Outsider Ready": (IN_PRACTICE, TO_LISTEN, MASTERED),
+        }
+        for title, statuses in progress.items():
+            song = Song(title=title, artist="Pool Artist",
+                        status=SongStatus.ACTIVE, duration_seconds=180,
+                        band_id=test_band.id)
+            db.session.add(song)
+            db.session.flush()
+            for user, status in zip((leader, other_user, outsider), statuses):
+                if status is not None:
+                    db.session.add(SongProgress(user_id=user.id,
+                                                song_id=song.id,
+                                                status=status))
+        db.session.commit()
+
+        result = generate_setlist_logic(
+            {'duration_minutes_total': 240, 'learning_ratio': 0.5},
+            test_band, test_user)
+
+        pools = {}
+        for item in result['setlist']:
+            pools.setdefault(item['block'], set()).add(item['title'])
+        assert pools == {
+            'maintenance': {"All Ready", "Mastered And Ready",
+                            "Outsider Practicing"},
+            'learning': {"Half Ready", "Missing Progress", "Outsider Ready"},
+        }
+
+    def test_cumulative_time_calculation(self, app, test_band, test_user,
+                                         standard_corpus):
+        """Test cumulative time is the running total of buffered durations."""
+        result = generate_setlist_logic(
+            {'duration_minutes_total': 60, 'learning_ratio': 0.0},
+            test_band, test_user)
+
+        setlist = result['setlist']
+        assert setlist
+        running_total = 0
+        for item in setlist:
+            running_total += item['duration_with_buffer']
+            assert item['cumulative_time'] == round(running_total, 1)
 
     def test_song_readiness_score_calculation(self, app, test_band, test_user):
         """Test song readiness score calculation."""
-        with app.app_context():
-            # Create multiple songs with different progress levels
-            songs = []
-            for i in range(3):
-                song = Song(
-                    title=f"Test Song {i}",
-                    artist=f"Test Artist {i}",
-                    status=SongStatus.ACTIVE,
-                    duration_minutes=5,
-                    band_id=test_band.id
-                )
-                songs.append(song)
-                db.session.add(song)
+        # Create multiple songs with different progress levels
+        songs = [
+            Song(
+                title=f"Test Song {i}",
+                artist=f"Test Artist {i}",
+                status=SongStatus.ACTIVE,
+                duration_seconds=300,  # 5 minutes
+                band_id=test_band.id
+            )
+            for i in range(3)
+        ]
+        db.session.add_all(songs)
+        db.session.flush()
+
+        # Create progress records with different statuses
+        progress_statuses = [
+            ProgressStatus.TO_LISTEN,
+            ProgressStatus.IN_PRACTICE,
+            ProgressStatus.READY_FOR_REHEARSAL,
+            ProgressStatus.MASTERED
+        ]
+
+        db.session.add_all([
+            SongProgress(
+                user_id=test_user.id,
+                song_id=song.id,
+                status=progress_statuses[i % len(progress_statuses)]
+            )
+            for i, song in enumerate(songs)
+        ])
 
-            db.session.flush()
+        db.session.commit()
+
+        # Test readiness scores
+        for i, song in enumerate(songs):
+            expected_score = (i % len(progress_statuses)) + 1  # 1-4
+            assert song.readiness_score == expected_score
 
-            # Create progress records with different statuses
-            progress_statuses = [
-                ProgressStatus.TO_LISTEN,
-                ProgressStatus.IN_PRACTICE,
-                ProgressStatus.READY_FOR_REHEARSAL,
-                ProgressStatus.MASTERED
-            ]
-
-            for i, song in enumerate(songs):
-                progress = SongProgress(
-                    user_id=test_user.id,
-                    song_id=song.id,
-                    status=progress_statuses[i % len(progress_statuses)]
-                )
-                db.session.add(progress)
-
-            db.session.commit()
-
-            # Test readiness scores
-            for i, song in enumerate(songs):
-                expected_score = (i % len(progress_statuses)) + 1  # 1-4
-                assert song.readiness_score == expected_score
-
-    def test_song_status_enum(self, app):
+    def test_song_status_enum(self):
         """Test song status enum values."""
         assert SongStatus.WISHLIST.value == 'wishlist'
         assert SongStatus.ACTIVE.value == 'active'
 
-    def test_progress_status_enum(self, app):
+    def test_progress_status_enum(self):
         """Test progress status enum values."""
         assert ProgressStatus.TO_LISTEN.value == 'To Listen'
         assert ProgressStatus.IN_PRACTICE.value == 'In Practice'
@@ -82,148 +191,139 @@ class TestSetlistAlgorithm:
 
     def test_song_duration_validation(self, app, test_band):
         """Test song duration validation."""
-        with app.app_context():
-            # Test valid duration
-            valid_song = Song(
-                title="Valid Song",
-                artist="Valid Artist",
-                status=SongStatus.ACTIVE,
-                duration_minutes=5,
-                band_id=test_band.id
-            )
-            db.session.add(valid_song)
-            db.session.commit()
-
-            assert valid_song.duration_minutes == 5
-
-            # Test None duration (optional field)
-            optional_duration_song = Song(
-                title="Optional Duration Song",
-                artist="Optional Artist",
-                status=SongStatus.WISHLIST,
-                band_id=test_band.id
-            )
-            db.session.add(optional_duration_song)
-            db.session.commit()
-
-            assert optional_duration_song.duration_minutes is None
+        # Test valid duration
+        valid_song = Song(
+            title="Valid Song",
+            artist="Valid Artist",
+            status=SongStatus.ACTIVE,
+            duration_seconds=300,
+            band_id=test_band.id
+        )
+        db.session.add(valid_song)
+        db.session.commit()
+
+        assert valid_song.duration_seconds == 300
+
+        # Test None duration (optional field)
+        optional_duration_song = Song(
+            title="Optional Duration Song",
+            artist="Optional Artist",
+            status=SongStatus.WISHLIST,
+            band_id=test_band.id
+        )
+        db.session.add(optional_duration_song)
+        db.session.commit()
+
+        assert optional_duration_song.duration_seconds is None
 
     def test_song_band_relationship(self, app, test_band):
         """Test song-band relationship."""
-        with app.app_context():
-            song = Song(
-                title="Relationship Test Song",
-                artist="Relationship Test Artist",
-                status=SongStatus.ACTIVE,
-                band_id=test_band.id
-            )
-            db.session.add(song)
-            db.session.commit()
-
-            assert song.band == test_band
-            assert song in test_band.songs
+        song = Song(
+            title="Relationship Test Song",
+            artist="Relationship Test Artist",
+            status=SongStatus.ACTIVE,
+            band_id=test_band.id
+        )
+        db.session.add(song)
+        db.session.commit()
+
+        assert song.band == test_band
+        assert song in test_band.songs
 
     def test_song_progress_relationship(self, app, test_user, test_song):
         """Test song-progress relationship."""
-        with app.app_context():
-            progress = SongProgress(
-                user_id=test_user.id,
-                song_id=test_song.id,
-                status=ProgressStatus.IN_PRACTICE
-            )
-            db.session.add(progress)
-            db.session.commit()
-
-            assert progress.song == test_song
-            assert progress.user == test_user
-            assert progress in test_song.progress
-            assert progress in test_user.progress
+        progress = SongProgress(
+            user_id=test_user.id,
+            song_id=test_song.id,
+            status=ProgressStatus.IN_PRACTICE
+        )
+        db.session.add(progress)
+        db.session.commit()
+
+        assert progress.song == test_song
+        assert progress.user == test_user
+        assert progress in test_song.progress
+        assert progress in test_user.progress
 
     def test_song_vote_relationship(self, app, test_user, test_song):
         """Test song-vote relationship."""
-        with app.app_context():
-            vote = Vote(
-                user_id=test_user.id,
-                song_id=test_song.id
-            )
-            db.session.add(vote)
-            db.session.commit()
-
-            assert vote.song == test_song
-            assert vote.user == test_user
-            assert vote in test_song.votes
-            assert vote in test_user.votes
+        vote = Vote(
+            user_id=test_user.id,
+            song_id=test_song.id
+        )
+        db.session.add(vote)
+        db.session.commit()
+
+        assert vote.song == test_song
+        assert vote.user == test_user
+        assert vote in test_song.votes
+        assert vote in test_user.votes
 
     def test_song_creation_timestamp(self, app, test_band):
         """Test song creation timestamp."""
-        with app.app_context():
-            before_creation = datetime.utcnow()
-            song = Song(
-                title="Timestamp Test Song",
-                artist="Timestamp Test Artist",
-                status=SongStatus.WISHLIST,
-                band_id=test_band.id
-            )
-            db.session.add(song)
-            db.session.commit()
-            after_creation = datetime.utcnow()
-
-            assert before_creation <= song.created_at <= after_creation
+        before_creation = datetime.utcnow()
+        song = Song(
+            title="Timestamp Test Song",
+            artist="Timestamp Test Artist",
+            status=SongStatus.WISHLIST,
+            band_id=test_band.id
+        )
+        db.session.add(song)
+        db.session.commit()
+        after_creation = datetime.utcnow()
+
+        assert before_creation <= song.created_at <= after_creation
 
     def test_song_last_rehearsed_date(self, app, test_band):
         """Test song last rehearsed date."""
-        with app.app_context():
-            rehearsal_date = date.today() - timedelta(days=7)
-            song = Song(
-                title="Rehearsal Date Test Song",
-                artist="Rehearsal Date Test Artist",
-                status=SongStatus.ACTIVE,
-                duration_minutes=5,
-                last_rehearsed_on=rehearsal_date,
-                band_id=test_band.id
-            )
-            db.session.add(song)
-            db.session.commit()
-
-            assert song.last_rehearsed_on == rehearsal_date
+        song = Song(
+            title="Rehearsal Date Test Song",
+            artist="Rehearsal Date Test Artist",
+            status=SongStatus.ACTIVE,
+            duration_seconds=300,
+            last_rehearsed_on=_WEEK_AGO,
+            band_id=test_band.id
+        )
+        db.session.add(song)
+        db.session.commit()
+
+        assert song.last_rehearsed_on == _WEEK_AGO
 
     def test_song_status_transitions(self, app, test_band):
         """Test song status transitions."""
-        with app.app_context():
-            song = Song(
-                title="Status Transition Song",
-                artist="Status Transition Artist",
-                status=SongStatus.WISHLIST,
-                band_id=test_band.id
-            )
-            db.session.add(song)
-            db.session.commit()
-
-            # Test transition from wishlist to active
-            assert song.status == SongStatus.WISHLIST
-            song.status = SongStatus.ACTIVE
-            db.session.commit()
-            assert song.status == SongStatus.ACTIVE
+        song = Song(
+            title="Status Transition Song",
+            artist="Status Transition Artist",
+            status=SongStatus.WISHLIST,
+            band_id=test_band.id
+        )
+        db.session.add(song)
+        db.session.commit()
+
+        # Test transition from wishlist to active
+        assert song.status == SongStatus.WISHLIST
+        song.status = SongStatus.ACTIVE
+        db.session.commit()
+        assert song.status == SongStatus.ACTIVE
 
     def test_song_progress_updates(self, app, test_user, test_song):
         """Test song progress updates."""
-        with app.app_context():
-            progress = SongProgress(
-                user_id=test_user.id,
-                song_id=test_song.id,
-                status=ProgressStatus.TO_LISTEN
-            )
-            db.session.add(progress)
-            db.session.commit()
-
-            # Test progress status update
-            assert progress.status == ProgressStatus.TO_LISTEN
-            progress.status = ProgressStatus.IN_PRACTICE
-            db.session.commit()
-            assert progress.status == ProgressStatus.IN_PRACTICE
-
-            # Test that updated_at is automatically updated
-            original_updated = progress.updated_at
-            progress.status = ProgressStatus.READY_FOR_REHEARSAL
-            db.session.commit()
-            assert progress.updated_at > original_updated
+        progress = SongProgress(
+            user_id=test_user.id,
+            song_id=test_song.id,
+            status=ProgressStatus.TO_LISTEN
+        )
+        db.session.add(progress)
+        db.session.commit()
+
+        # Test progress status update
+        assert progress.status == ProgressStatus.TO_LISTEN
+        progress.status = ProgressStatus.IN_PRACTICE
+        db.session.commit()
+        assert progress.status == ProgressStatus.IN_PRACTICE
+
+        # Test that updated_at is automatically updated
+        original_updated = progress.updated_at
+        progress.status = ProgressStatus.READY_FOR_REHEARSAL
+        db.session.commit()
+        assert progress.updated_at > original_updated
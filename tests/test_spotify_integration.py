@@ -1,22 +1,126 @@
+import base64
+import json
 import os
+import re
 import pytest
+import requests
 import responses
-from unittest.mock import patch
-
-from app.spotify import SpotifyAPI, spotify_api
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+
+from app.spotify import SpotifyAPI
+
+TOKEN_URL = 'https://accounts.spotify.com/api/token'
+SEARCH_URL = re.compile(r'https://api\.spotify\.com/v1/search')
+TRACK_URL = 'https://api.spotify.com/v1/tracks/track1'
+
+TOKEN_RESPONSE = {
+    'access_token': 'test_token_123',
+    'expires_in': 3600,
+    'token_type': 'Bearer'
+}
+TRACK_RESPONSE = {
+    'id': 'track1',
+    'name': 'Test Song',
+    'artists': [{'name': 'Test Artist'}],
+    'album': {
+        'name': 'Test Album',
+        'images': [{'url': 'http://example.com/image.jpg'}]
+    },
+    'duration_ms': 180000,
+    'external_urls': {
+        'spotify': 'https://open.spotify.com/track/track1'}
+}
+SEARCH_RESPONSE = {'tracks': {'items': [TRACK_RESPONSE]}}
+
+# Search endpoint behaviour keyed by query: (status, payload), (status,
+# payload, headers), an exception, or a list of those answered one per call
+# with the last one repeating
+RATE_LIMITED = (429, {'error': {'status': 429,
+                                'message': 'Rate limit exceeded'}})
+RATE_LIMITED_LONG = (*RATE_LIMITED, {'Retry-After': '3600'})
+INVALID_TOKEN = (401, {'error': {'status': 401,
+                                 'message': 'Invalid access token'}})
+SEARCH_RESPONSES = {
+    'test': (200, SEARCH_RESPONSE),
+    'malformed': (200, {'tracks': {'items': [
+        {'id': 'track1', 'name': 'Test Song'}  # Missing required fields
+    ]}}),
+    'timeout': requests.exceptions.ConnectTimeout("Connection timeout"),
+    'rate limited': RATE_LIMITED,
+    'rate limited once': [RATE_LIMITED, (200, SEARCH_RESPONSE)],
+    'rate limited long': RATE_LIMITED_LONG,
+    'invalid token': INVALID_TOKEN,
+    'token expired once': [INVALID_TOKEN, (200, SEARCH_RESPONSE)],
+}
+
+# Bodies are serialized once here rather than on every registration or call
+_TOKEN_BODY = json.dumps(TOKEN_RESPONSE).encode()
+_TRACK_BODY = json.dumps(TRACK_RESPONSE).encode()
+
+
+def _serialize(response):
+    """Encode a SEARCH_RESPONSES entry to (status, headers, JSON bytes)"""
+    if isinstance(response, Exception):
+        return response
+    status, payload, *headers = response
+    # Rate limits ask for an immediate retry unless told otherwise
+    headers = headers[0] if headers else (
+        {'Retry-After': '0'} if status == 429 else {})
+    return status, headers, json.dumps(payload).encode()
+
+
+_SEARCH_BODIES = {
+    query: ([_serialize(r) for r in response] if isinstance(response, list)
+            else _serialize(response))
+    for query, response in SEARCH_RESPONSES.items()
+}
+_search_calls = Counter()
+
+
+def _search_callback(request):
+    """Answer a search request from SEARCH_RESPONSES"""
+    query = parse_qs(urlparse(request.url).query)['q'][0]
+    response = _SEARCH_BODIES[query]
+    if isinstance(response, list):
+        response = response[min(_search_calls[query], len(response) - 1)]
+    _search_calls[query] += 1
+    if isinstance(response, Exception):
+        raise response
+    return response
+
+
+def _register_search(rsps):
+    """Route every search request through _search_callback"""
+    rsps.add_callback(responses.GET, SEARCH_URL, callback=_search_callback,
+                      content_type='application/json')
+
+
+@pytest.fixture(scope='module')
+def _http_mock():
+    """Intercept requests with one responses mock for the whole module"""
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        _register_search(rsps)
+        yield rsps
+
+
+@pytest.fixture
+def mocked_http(_http_mock):
+    """The module's responses mock, cleared after each test"""
+    yield _http_mock
+    _http_mock.reset()
+    _register_search(_http_mock)
+    _search_calls.clear()
 
 
 class TestSpotifyAPI:
     """Test cases for Spotify API integration"""
 
-    def setup_method(self):
+    @pytest.fixture(autouse=True)
+    def _api(self, configured_api, spotify_clock):
         """Set up test environment"""
-        self.api = SpotifyAPI()
-        self.api.client_id = "test_client_id"
-        self.api.client_secret = "test_client_secret"
-        self.api.access_token = None
-        self.api.token_expires_at = None
-        self.api.last_error = None
+        self.api = configured_api
+        self.now = spotify_clock
 
     def test_init_with_credentials(self):
         """Test API initialization with credentials"""
@@ -38,18 +142,14 @@ class TestSpotifyAPI:
         self.api.client_secret = None
         assert self.api.is_configured is False
 
-    @responses.activate
-    def test_get_access_token_success(self):
+    def test_get_access_token_success(self, mocked_http):
         """Test successful access token retrieval"""
         # Mock successful response
-        responses.add(
+        mocked_http.add(
             responses.POST,
-            'https://accounts.spotify.com/api/token',
-            json={
-                'access_token': 'test_token_123',
-                'expires_in': 3600,
-                'token_type': 'Bearer'
-            },
+            TOKEN_URL,
+            body=_TOKEN_BODY,
+            content_type='application/json',
             status=200
         )
 
@@ -57,15 +157,15 @@ class TestSpotifyAPI:
 
         assert token == 'test_token_123'
         assert self.api.access_token == 'test_token_123'
+        assert self.api.token_expires_at == self.now + 3600 - 300
         assert self.api.last_error is None
 
-    @responses.activate
-    def test_get_access_token_failure(self):
+    def test_get_access_token_failure(self, mocked_http):
         """Test access token retrieval failure"""
         # Mock failed response
-        responses.add(
+        mocked_http.add(
             responses.POST,
-            'https://accounts.spotify.com/api/token',
+            TOKEN_URL,
             json={'error': 'invalid_client'},
             status=400
         )
@@ -73,16 +173,15 @@ class TestSpotifyAPI:
         token = self.api._get_access_token()
 
         assert token is None
-        assert self.api.last_error is not None
+        assert '400' in self.api.last_error
 
-    @responses.activate
-    def test_get_access_token_timeout(self):
+    def test_get_access_token_timeout(self, mocked_http):
         """Test access token retrieval timeout"""
         # Mock timeout
-        responses.add(
+        mocked_http.add(
             responses.POST,
-            'https://accounts.spotify.com/api/token',
-            body=Exception("Connection timeout")
+            TOKEN_URL,
+            body=requests.exceptions.ConnectTimeout("Connection timeout")
         )
 
         token = self.api._get_access_token()
@@ -95,10 +194,18 @@ class TestSpotifyAPI:
         header = self.api._get_basic_auth_header()
 
         # Should be base64 encoded
-        import base64
         decoded = base64.b64decode(header).decode()
         assert decoded == f"{self.api.client_id}:{self.api.client_secret}"
 
+    def test_get_basic_auth_header_cached(self):
+        """Test basic auth header is reused until the credentials change"""
+        header = self.api._get_basic_auth_header()
+        assert self.api._get_basic_auth_header() is header
+
+        self.api.client_secret = "new_secret"
+        decoded = base64.b64decode(self.api._get_basic_auth_header()).decode()
+        assert decoded == f"{self.api.client_id}:new_secret"
+
     def test_is_token_valid(self):
         """Test token validity checking"""
         # No token
@@ -110,37 +217,15 @@ class TestSpotifyAPI:
         assert self.api._is_token_valid() is True
 
         # Expired token
-        self.api.token_expires_at = 0  # Past time
+        self.api.token_expires_at = self.now - 1  # Past time
         assert self.api._is_token_valid() is False
 
-    @responses.activate
-    def test_search_tracks_success(self):
-        """Test successful track search"""
-        # Mock successful search response
-        responses.add(
-            responses.GET,
-            'https://api.spotify.com/v1/search?q=test&type=track&limit=10&market=US',
-            json={
-                'tracks': {
-                    'items': [
-                        {
-                            'id': 'track1',
-                            'name': 'Test Song',
-                            'artists': [{'name': 'Test Artist'}],
-                            'album': {
-                                'name': 'Test Album',
-                                'images': [{'url': 'http://example.com/image.jpg'}]
-                            },
-                            'duration_ms': 180000,
-                            'external_urls': {
-                                'spotify': 'https://open.spotify.com/track/track1'}
-                        }
-                    ]
-                }
-            },
-            status=200
-        )
+        # Explicit clock reading
+        self.api.token_expires_at = 1000
+        assert self.api._is_token_valid(now=1000) is False
 
+    def test_search_tracks_success(self, mocked_http):
+        """Test successful track search"""
         # Set valid token
         self.api.access_token = "test_token"
         self.api.token_expires_at = 1000
@@ -154,8 +239,7 @@ class TestSpotifyAPI:
         assert result['tracks'][0]['title'] == 'Test Song'
         assert result['tracks'][0]['duration_minutes'] == 3.0
 
-    @responses.activate
-    def test_search_tracks_no_credentials(self):
+    def test_search_tracks_no_credentials(self, mocked_http):
         """Test search without credentials"""
         self.api.client_id = None
         self.api.client_secret = None
@@ -165,13 +249,12 @@ class TestSpotifyAPI:
         assert result['tracks'] == []
         assert result['error'] == 'Spotify API not configured'
 
-    @responses.activate
-    def test_search_tracks_authentication_failure(self):
+    def test_search_tracks_authentication_failure(self, mocked_http):
         """Test search with authentication failure"""
         # Mock failed auth
-        responses.add(
+        mocked_http.add(
             responses.POST,
-            'https://accounts.spotify.com/api/token',
+            TOKEN_URL,
             json={'error': 'invalid_client'},
             status=400
         )
@@ -181,75 +264,37 @@ class TestSpotifyAPI:
         assert result['tracks'] == []
         assert 'Failed to authenticate' in result['error']
 
-    @responses.activate
-    def test_search_tracks_timeout(self):
+    def test_search_tracks_timeout(self, mocked_http):
         """Test search timeout handling"""
-        # Mock timeout
-        responses.add(
-            responses.GET,
-            'https://api.spotify.com/v1/search?q=test&type=track&limit=10&market=US',
-            body=Exception("Connection timeout")
-        )
-
         # Set valid token
         self.api.access_token = "test_token"
         self.api.token_expires_at = 1000
 
-        result = self.api.search_tracks("test")
+        result = self.api.search_tracks("timeout")
 
         assert result['tracks'] == []
         assert 'timeout' in result['error'].lower()
 
-    @responses.activate
-    def test_search_tracks_malformed_data(self):
+    def test_search_tracks_malformed_data(self, mocked_http):
         """Test handling of malformed track data"""
-        # Mock response with malformed data
-        responses.add(
-            responses.GET,
-            'https://api.spotify.com/v1/search?q=test&type=track&limit=10&market=US',
-            json={
-                'tracks': {
-                    'items': [
-                        {
-                            'id': 'track1',
-                            'name': 'Test Song',
-                            # Missing required fields
-                        }
-                    ]
-                }
-            },
-            status=200
-        )
-
         # Set valid token
         self.api.access_token = "test_token"
         self.api.token_expires_at = 1000
 
-        result = self.api.search_tracks("test")
+        result = self.api.search_tracks("malformed")
 
         # Should handle gracefully and skip malformed tracks
         assert result['tracks'] == []
         assert result['error'] is None
 
-    @responses.activate
-    def test_get_track_success(self):
+    def test_get_track_success(self, mocked_http):
         """Test successful single track retrieval"""
         # Mock successful track response
-        responses.add(
+        mocked_http.add(
             responses.GET,
-            'https://api.spotify.com/v1/tracks/track1',
-            json={
-                'id': 'track1',
-                'name': 'Test Song',
-                'artists': [{'name': 'Test Artist'}],
-                'album': {
-                    'name': 'Test Album',
-                    'images': [{'url': 'http://example.com/image.jpg'}]
-                },
-                'duration_ms': 180000,
-                'external_urls': {
-                    'spotify': 'https://open.spotify.com/track/track1'}
-            },
+            TRACK_URL,
+            body=_TRACK_BODY,
+            content_type='application/json',
             status=200
         )
 
@@ -263,19 +308,15 @@ class TestSpotifyAPI:
         assert track['title'] == 'Test Song'
         assert track['duration_minutes'] == 3.0
 
-    def test_duration_calculation(self):
+    @pytest.mark.parametrize('ms, expected_minutes', [
+        (60000, 1.0),    # 1 minute
+        (90000, 1.5),    # 1.5 minutes
+        (180000, 3.0),   # 3 minutes
+        (300000, 5.0),   # 5 minutes
+    ])
+    def test_duration_calculation(self, ms, expected_minutes):
         """Test duration calculation from milliseconds"""
-        # Test various durations
-        test_cases = [
-            (60000, 1.0),    # 1 minute
-            (90000, 1.5),    # 1.5 minutes
-            (180000, 3.0),   # 3 minutes
-            (300000, 5.0),   # 5 minutes
-        ]
-        
-        for ms, expected_minutes in test_cases:
-            calculated = round(ms / 60000, 1)
-            assert calculated == expected_minutes
+        assert round(ms / 60000, 1) == expected_minutes
 
     def test_error_message_persistence(self):
         """Test that error messages are properly stored"""
@@ -287,76 +328,102 @@ class TestSpotifyAPI:
         assert self.api.last_error is None
 
 
-class TestSpotifyIntegration:
-    """Integration tests for Spotify API"""
-
-    @patch.dict(os.environ, {
-        'SPOTIFY_CLIENT_ID': 'test_id',
-        'SPOTIFY_CLIENT_SECRET': 'test_secret'})
-    def test_global_instance_creation(self):
-        """Test that global spotify_api instance is created"""
-        from app.spotify import spotify_api
-        assert isinstance(spotify_api, SpotifyAPI)
-        assert spotify_api.is_configured is True
-
-    @patch.dict(os.environ, {}, clear=True)
-    def test_global_instance_no_credentials(self):
-        """Test global instance without credentials"""
-        from app.spotify import spotify_api
-        assert isinstance(spotify_api, SpotifyAPI)
-        assert spotify_api.is_configured is False
+def test_global_instance(spotify_module):
+    """Test the global spotify_api instance reads credentials from the env"""
+    assert isinstance(spotify_module.spotify_api, spotify_module.SpotifyAPI)
+    assert spotify_module.spotify_api.is_configured is bool(
+        os.getenv('SPOTIFY_CLIENT_ID'))
 
 
 class TestSpotifyAPIRateLimiting:
     """Test rate limiting and error handling"""
 
-    def setup_method(self):
+    @pytest.fixture(autouse=True)
+    def _api(self, configured_api, spotify_clock):
         """Set up test environment"""
-        self.api = SpotifyAPI()
-        self.api.client_id = "test_client_id"
-        self.api.client_secret = "test_client_secret"
-
-    @responses.activate
-    def test_rate_limit_handling(self):
-        """Test handling of rate limit responses"""
-        # Mock rate limit response
-        responses.add(
-            responses.GET,
-            'https://api.spotify.com/v1/search?q=test&type=track&limit=10&market=US',
-            json={'error': {'status': 429, 'message': 'Rate limit exceeded'}},
-            status=429
-        )
+        self.api = configured_api
+        self.now = spotify_clock
 
+    def test_rate_limit_retried(self, mocked_http):
+        """Test a rate limited search is retried and succeeds"""
         # Set valid token
         self.api.access_token = "test_token"
         self.api.token_expires_at = 1000
 
-        result = self.api.search_tracks("test")
+        result = self.api.search_tracks("rate limited once")
+
+        assert result['error'] is None
+        assert len(result['tracks']) == 1
+        assert _search_calls["rate limited once"] == 2
+
+    def test_rate_limit_handling(self, mocked_http):
+        """Test handling of rate limit responses once retries run out"""
+        # Set valid token
+        self.api.access_token = "test_token"
+        self.api.token_expires_at = 1000
+
+        result = self.api.search_tracks("rate limited")
 
         assert result['tracks'] == []
         assert 'failed' in result['error'].lower()
+        assert _search_calls["rate limited"] == 2  # First try and 1 retry
 
-    @responses.activate
-    def test_invalid_token_handling(self):
-        """Test handling of invalid token responses"""
-        # Mock invalid token response
-        responses.add(
-            responses.GET,
-            'https://api.spotify.com/v1/search?q=test&type=track&limit=10&market=US',
-            json={'error': {'status': 401, 'message': 'Invalid access token'}},
-            status=401
+    def test_long_retry_after_fails_fast(self, mocked_http, monkeypatch):
+        """Test a long Retry-After is not waited out"""
+        sleeps = []
+        monkeypatch.setattr('app.spotify.sleep', sleeps.append)
+        self.api.access_token = "test_token"
+        self.api.token_expires_at = 1000
+
+        result = self.api.search_tracks("rate limited long")
+
+        assert result['tracks'] == []
+        assert 'failed' in result['error'].lower()
+        assert sleeps == []
+        assert _search_calls["rate limited long"] == 1
+
+    def test_invalid_token_refreshed(self, mocked_http):
+        """Test a rejected token is renewed once and the search repeated"""
+        mocked_http.add(
+            responses.POST,
+            TOKEN_URL,
+            body=_TOKEN_BODY,
+            content_type='application/json',
+            status=200
+        )
+
+        # Set a token Spotify will reject
+        self.api.access_token = "invalid_token"
+        self.api.token_expires_at = 1000
+
+        result = self.api.search_tracks("token expired once")
+
+        assert result['error'] is None
+        assert len(result['tracks']) == 1
+        assert self.api.access_token == 'test_token_123'
+        assert len(mocked_http.calls) == 3  # Search, token, search
+
+    def test_invalid_token_handling(self, mocked_http):
+        """Test a token that stays invalid is only renewed once"""
+        mocked_http.add(
+            responses.POST,
+            TOKEN_URL,
+            body=_TOKEN_BODY,
+            content_type='application/json',
+            status=200
         )
 
         # Set invalid token
         self.api.access_token = "invalid_token"
         self.api.token_expires_at = 1000
 
-        result = self.api.search_tracks("test")
+        result = self.api.search_tracks("invalid token")
 
-        # Should attempt to refresh token
         assert result['tracks'] == []
-        assert 'Failed to authenticate' in result['error']
-
+        assert 'failed' in result['error'].lower()
+        token_calls = [call for call in mocked_http.calls
+                       if call.request.url == TOKEN_URL]
+        assert len(token_calls) == 1
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])